@@ -0,0 +1,44 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+_REPORT_CACHE_SIZE = 4
+
+
+def prepare_report_data(report_data):
+    # Normalize the fields both report builders derive from the drive stats
+    # once, so generating the email and Discord reports in the same job does
+    # not repeat the per-drive work.
+    for d in report_data['drive_stats']:
+        d['display_name'] = d['drive_name'] or 'Full Array'
+        d['row_class'] = '' if d['drive_name'] else 'array_stats'
+
+    return report_data
+
+
+def cache_report(create_report):
+    # The report builders are pure functions of their report data, so retries
+    # and webhook re-posts with identical data can reuse the formatted output
+    # instead of re-rendering it. Keyed on a digest of the canonicalized data.
+    cache = OrderedDict()
+
+    def cached_create_report(**report_data):
+        key = hashlib.blake2b(
+            json.dumps(report_data, sort_keys=True, default=str).encode(),
+            digest_size=16).digest()
+
+        if key in cache:
+            cache.move_to_end(key)
+
+            return cache[key]
+
+        report = create_report(**report_data)
+
+        cache[key] = report
+
+        if len(cache) > _REPORT_CACHE_SIZE:
+            cache.popitem(last=False)
+
+        return report
+
+    return cached_create_report
@@ -1,26 +1,67 @@
 from operator import itemgetter
 
+from reports import cache_report
+
 did_not_run_color = 8539930
 did_run_color = 1737287
 
 empty_field = {'name': '** **', 'value': '** **'}
 
+diff_fields = (('Added', 'added'), ('Removed', 'removed'), ('Updated', 'updated'),
+               ('Moved', 'moved'), ('Copied', 'copied'), ('Restored', 'restored'))
+
+# Pre-formatted field templates so the per-drive loops reuse one constant
+# format string instead of rebuilding a multi-line f-string per row. The
+# non-breaking spaces that keep the code blocks aligned are baked into the
+# templates, which saves a full replace() scan over every rendered field.
+array_field_format = (
+    '```\n'
+    'Total\u00A0use\u00A0(%)\u00A0\u00A0\u00A0\u00A0\u00A0{}\n'
+    'Fragmented\u00A0Files\u00A0\u00A0{}\n'
+    'Excess\u00A0Fragments\u00A0\u00A0{}\n'
+    'Wasted\u00A0Space\u00A0(GB)\u00A0{}\n'
+    'Used\u00A0Space\u00A0(GB)\u00A0\u00A0\u00A0{}\n'
+    'Free\u00A0Space\u00A0(GB)\u00A0\u00A0\u00A0{}\n'
+    '```'
+)
+
+array_field_values = itemgetter('use_percent', 'fragmented_files', 'excess_fragments',
+                                'wasted_gb', 'used_gb', 'free_gb')
+
+smart_field_format = (
+    '```\n'
+    'Temperature\u00A0(°C)\u00A0\u00A0\u00A0\u00A0\u00A0{}\n'
+    'Power\u00A0On\u00A0Time\u00A0(days)\u00A0{}\n'
+    'Error\u00A0Count\u00A0\u00A0\u00A0\u00A0\u00A0\u00A0\u00A0\u00A0\u00A0\u00A0{}\n'
+    'Failure\u00A0Probability\u00A0\u00A0{}\n'
+    'Drive\u00A0Size\u00A0(TiB)\u00A0\u00A0\u00A0\u00A0\u00A0{}\n'
+    '```'
+)
+
+smart_field_values = itemgetter('temp', 'power_on_days', 'error_count', 'fp', 'size')
+
+
+def make_array_field(d):
+    return {
+        'name': d['display_name'],
+        'value': array_field_format.format(*array_field_values(d)),
+        'inline': True
+    }
+
+
+def make_smart_field(d):
+    return {
+        'name': f'{d["device"]} (`{d["serial"]}`)' if d['disk'] == '-'
+        else f'{d["disk"]} ({d["device"]}, `{d["serial"]}`)',
+        'value': smart_field_format.format(*smart_field_values(d)),
+        'inline': True
+    }
 
-def create_discord_report(report_data):
-    sync_job_ran, scrub_job_ran, sync_job_time, scrub_job_time, diff_data, zero_subsecond_count, \
-        scrub_stats, drive_stats, smart_drive_data, global_fp, total_time = itemgetter(
-            'sync_job_ran',
-            'scrub_job_ran',
-            'sync_job_time',
-            'scrub_job_time',
-            'diff_data',
-            'zero_subsecond_count',
-            'scrub_stats',
-            'drive_stats',
-            'smart_drive_data',
-            'global_fp',
-            'total_time')(report_data)
 
+@cache_report
+def create_discord_report(*, sync_job_ran, scrub_job_ran, sync_job_time, scrub_job_time,
+                          diff_data, zero_subsecond_count, scrub_stats, drive_stats,
+                          smart_drive_data, global_fp, total_time):
     touch_embed = {'title': 'Touch Job'}
 
     if zero_subsecond_count > 0:
@@ -37,30 +78,10 @@ def create_discord_report(report_data):
         sync_embed['color'] = did_run_color
         sync_embed['description'] = 'Sync Job finished successfully :white_check_mark:'
         sync_embed['fields'] = [{
-            'name': 'Added',
-            'value': f'```{diff_data["added"]}```',
-            'inline': True
-        }, {
-            'name': 'Removed',
-            'value': f'```{diff_data["removed"]}```',
-            'inline': True
-        }, {
-            'name': 'Updated',
-            'value': f'```{diff_data["updated"]}```',
-            'inline': True
-        }, {
-            'name': 'Moved',
-            'value': f'```{diff_data["moved"]}```',
+            'name': name,
+            'value': f'```{diff_data[key]}```',
             'inline': True
-        }, {
-            'name': 'Copied',
-            'value': f'```{diff_data["copied"]}```',
-            'inline': True
-        }, {
-            'name': 'Restored',
-            'value': f'```{diff_data["restored"]}```',
-            'inline': True
-        }]
+        } for name, key in diff_fields]
 
         sync_embed['footer'] = {
             'text': f'Elapsed time {sync_job_time}'
@@ -89,24 +110,19 @@ def create_discord_report(report_data):
         'fields': []
     }
 
-    for i, d in enumerate(drive_stats):
-        field = {
-            'name': d['drive_name'] if d['drive_name'] else 'Full Array',
-            'value': f'''```
-Total use (%)     {d["use_percent"]}
-Fragmented Files  {d["fragmented_files"]}
-Excess Fragments  {d["excess_fragments"]}
-Wasted Space (GB) {d["wasted_gb"]}
-Used Space (GB)   {d["used_gb"]}
-Free Space (GB)   {d["free_gb"]}
-```'''.replace(' ', '\u00A0'),
-            'inline': True
-        }
+    # Fields are laid out two per row; a spacer goes after every full pair
+    # except the last, so the pairwise loop only branches on the pair bounds.
+    drive_count = len(drive_stats)
+    array_fields = array_report_embed['fields']
 
-        array_report_embed['fields'].append(field)
+    for i in range(0, drive_count, 2):
+        array_fields.append(make_array_field(drive_stats[i]))
 
-        if (i + 1) % 2 == 0 and i + 1 != len(drive_stats):
-            array_report_embed['fields'].append(empty_field)
+        if i + 1 < drive_count:
+            array_fields.append(make_array_field(drive_stats[i + 1]))
+
+        if i + 2 < drive_count:
+            array_fields.append(empty_field)
 
     smart_report_embed = {
         'title': 'SMART Report',
@@ -115,23 +131,17 @@ Free Space (GB)   {d["free_gb"]}
         'fields': [],
     }
 
-    for i, d in enumerate(smart_drive_data):
-        field = {
-            'name': f'{d["device"]} (`{d["serial"]}`)' if d['disk'] == '-' else f'{d["disk"]} ({d["device"]}, `{d["serial"]}`)',
-            'value': f'''```
-Temperature (°C)     {d["temp"]}
-Power On Time (days) {d["power_on_days"]}  
-Error Count          {d["error_count"]}
-Failure Probability  {d["fp"]}
-Drive Size (TiB)     {d["size"]}
-```'''.replace(' ', '\u00A0'),
-            'inline': True
-        }
+    smart_count = len(smart_drive_data)
+    smart_fields = smart_report_embed['fields']
+
+    for i in range(0, smart_count, 2):
+        smart_fields.append(make_smart_field(smart_drive_data[i]))
 
-        smart_report_embed['fields'].append(field)
+        if i + 1 < smart_count:
+            smart_fields.append(make_smart_field(smart_drive_data[i + 1]))
 
-        if (i + 1) % 2 == 0 and i + 1 != len(smart_drive_data):
-            smart_report_embed['fields'].append(empty_field)
+        if i + 2 < smart_count:
+            smart_fields.append(empty_field)
 
     embeds = [
         touch_embed,
@@ -1,23 +1,29 @@
 import argparse
-import concurrent.futures
-import gzip
+import atexit
+import functools
 import json
 import logging
 import logging.handlers
-import math
 import os
+import platform
+import queue
 import re
-import shutil
+import selectors
 import subprocess
+import threading
+import time
 import traceback
-from datetime import datetime, timedelta
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from operator import itemgetter
 
-import psutil
-import requests
+# psutil, requests and jsonschema are imported lazily at their use sites;
+# they are expensive to import and not needed on every run.
 import pidfile
-from jsonschema import validate
+import zstandard
 
+from reports import prepare_report_data
 from reports.discord_report import create_discord_report
 from reports.email_report import create_email_report
 from utils import format_delta, get_relative_path, human_readable_size, run_script
@@ -25,56 +31,185 @@ from utils import format_delta, get_relative_path, human_readable_size, run_scri
 #
 # Read config
 
-with open(get_relative_path(__file__, './config.json'), 'r') as f:
+config_path = get_relative_path(__file__, './config.json')
+
+with open(config_path, 'r') as f:
     config = json.load(f)
 
-with open(get_relative_path(__file__, './config.schema.json'), 'r') as f:
-    schema = json.load(f)
 
-validate(instance=config, schema=schema)
+#
+# Validate config
+#
+# Validation is skipped when config.json has not changed since the last
+# validated run, so frequent cron invocations don't re-validate a static file.
+
+config_mtime = str(os.path.getmtime(config_path))
+config_mtime_marker = '/tmp/snapper.config.mtime'
+
+try:
+    with open(config_mtime_marker, 'r') as f:
+        validated_mtime = f.read()
+except OSError:
+    validated_mtime = None
+
+if config_mtime != validated_mtime:
+    from jsonschema import Draft202012Validator
+
+    with open(get_relative_path(__file__, './config.schema.json'), 'r') as f:
+        schema = json.load(f)
+
+    # Build the validator directly instead of going through jsonschema.validate(),
+    # which re-checks the (static) schema and recompiles a validator on every run.
+    Draft202012Validator(schema).validate(config)
+
+    with open(config_mtime_marker, 'w') as f:
+        f.write(config_mtime)
+
+# The config dict is static after load, so the values hot paths need (every
+# SnapRAID invocation, every Discord notification) are resolved once here.
+snapraid_bin, snapraid_config_file = itemgetter('binary', 'config')(config['snapraid'])
+discord_enabled, discord_webhook_id, discord_webhook_token = itemgetter(
+    'enabled', 'webhook_id', 'webhook_token')(config['notifications']['discord'])
 
 
 #
 # Configure logging
 
-def rotator(source, dest):
+def compress_log(source, dest):
+    # zstd at level 3 compresses repetitive log text at a gzip-like ratio
+    # but many times the throughput.
     with open(source, 'rb') as f_in:
-        with gzip.open(dest, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
+        with open(dest, 'wb') as f_out:
+            zstandard.ZstdCompressor(level=3).copy_stream(f_in, f_out)
 
     os.remove(source)
 
 
+def rotator(source, dest):
+    # The rename is cheap and keeps the per-run rotation semantics; the
+    # compression of the rotated file runs on a background thread so startup
+    # doesn't block on squeezing a potentially huge previous log.
+    pending = source + '.rotating'
+
+    # If an earlier run died mid-compression, the pending file is the only
+    # copy of that run's log; finish squeezing it (synchronously, to a
+    # recovery name) so the rename below cannot overwrite it.
+    if os.path.isfile(pending):
+        compress_log(pending, pending + '.zst')
+
+    os.replace(source, pending)
+
+    compress_thread = threading.Thread(target=compress_log, args=(pending, dest))
+    compress_thread.start()
+
+    atexit.register(compress_thread.join)
+
+
 def setup_logger(name, log_file, level='INFO'):
     log_dir, max_count = itemgetter('dir', 'max_count')(config['logs'])
 
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
 
     log_file_path = os.path.join(log_dir, log_file)
-    needs_rollover = os.path.isfile(log_file_path)
+    # Rotation stays per-run so each log holds exactly one run, but an empty
+    # leftover file has nothing worth keeping; delay=True defers opening the
+    # stream until the first record is actually emitted.
+    needs_rollover = os.path.isfile(log_file_path) and os.path.getsize(log_file_path) > 0
 
-    handler = logging.handlers.RotatingFileHandler(log_file_path, backupCount=max(max_count, 1))
+    handler = logging.handlers.RotatingFileHandler(log_file_path, backupCount=max(max_count, 1),
+                                                   delay=True)
     handler.setFormatter(logging.Formatter('[%(asctime)s] - [%(levelname)s] - %(message)s'))
 
     handler.rotator = rotator
-    handler.namer = lambda file_name: file_name + '.gz'
+    handler.namer = lambda file_name: file_name + '.zst'
 
     if needs_rollover:
         handler.doRollover()
 
+    # Buffer records in memory and flush in batches, so the raw SnapRAID
+    # stream doesn't pay one write() syscall per output line. Errors and
+    # shutdown still flush immediately.
+    memory_handler = logging.handlers.MemoryHandler(
+        capacity=1024, flushLevel=logging.ERROR, target=handler, flushOnClose=True)
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    logger.addHandler(handler)
+    logger.addHandler(memory_handler)
     logger.propagate = False
 
     return logger
 
 
+#
+# Precompiled regexes
+#
+# Everything SnapRAID output is matched against is compiled once at import;
+# the progress regex in particular runs against every streamed stdout line.
+
+# All the facts get_status needs are matched in one linear scan over the
+# status output; which alternative matched is detected via its named groups.
+status_regex = re.compile(
+    r'^ *(?P<file_count>\d+) +(?P<fragmented_files>\d+) +(?P<excess_fragments>\d+) +('
+    r'?P<wasted_gb>[-.\d]+) +(?P<used_gb>\d+) +(?P<free_gb>\d+) +(?P<use_percent>\d+)%(?: +('
+    r'?P<drive_name>\S+)|$)|'
+    r'scrubbed (?P<scrub_age>\d+) days ago, the median (?P<median>\d+), the newest ('
+    r'?P<newest>\d+)|'
+    r'^The (?P<not_scrubbed_percent>\d+)% of the array is not scrubbed|'
+    r'^DANGER! In the array there are (?P<error_count>\d+) errors!|'
+    r'^You have (?P<touch_files>\d+) files with (?:a )?zero sub-second timestamp|'
+    r'^(?P<sync_in_progress>You have a sync in progress)',
+    flags=re.MULTILINE)
+
+drive_stat_fields = ('file_count', 'fragmented_files', 'excess_fragments', 'wasted_gb',
+                     'used_gb', 'free_gb', 'use_percent', 'drive_name')
+
+diff_regex = re.compile(r'''^ *(?P<equal>\d+) equal$
+^ *(?P<added>\d+) added$
+^ *(?P<removed>\d+) removed$
+^ *(?P<updated>\d+) updated$
+^ *(?P<moved>\d+) moved$
+^ *(?P<copied>\d+) copied$
+^ *(?P<restored>\d+) restored$''', flags=re.MULTILINE)
+
+diff_keys = ('equal', 'added', 'removed', 'updated', 'moved', 'copied', 'restored')
+
+# Any nonzero counter among these means there is something to sync.
+sync_trigger_keys = diff_keys[1:]
+
+# As with status_regex, the drive rows and the global failure probability
+# are pulled out of the smart output in one scan.
+smart_regex = re.compile(r'^ *(?P<temp>\d+|-) +(?P<power_on_days>\d+|-) +('
+                         r'?P<error_count>\d+|-) +(?P<fp>\d+%|-|SSD) +(?P<size>\S+) +('
+                         r'?P<serial>\S+) +(?P<device>\S+) +(?P<disk>\S+)$|'
+                         r'next year is (?P<total_fp>\d+)%',
+                         flags=re.MULTILINE)
+
+smart_drive_fields = ('temp', 'power_on_days', 'error_count', 'fp', 'size',
+                      'serial', 'device', 'disk')
+
+progress_regex = re.compile(r'^(?P<progress>\d+)%, (?P<progress_mb>\d+) MB'
+                            r'(?:, (?P<speed_mb>\d+) MB/s, (?P<speed_stripe>\d+) stripe/s, '
+                            r'CPU (?P<cpu>\d+)%, (?P<eta_h>\d+):(?P<eta_m>\d+) ETA)?$',
+                            flags=re.MULTILINE)
+
+safe_sync_errors_regex = re.compile(r'^(?:'
+                                    r'WARNING! You cannot modify (?:files|data disk) during a sync\.|'
+                                    r'Unexpected (?:time|size) change at file .+|'
+                                    r'Missing file .+|'
+                                    r'Rerun the sync command when finished\.|'
+                                    r'WARNING! With \d+ disks it\'s recommended to use \w+ parity levels\.|'
+                                    r'WARNING! Unexpected file errors!'
+                                    r')\s*',
+                                    flags=re.MULTILINE | re.IGNORECASE)
+
+rerun_sync_regex = re.compile(r'^Rerun the sync command when finished',
+                              flags=re.MULTILINE | re.IGNORECASE)
+
+
 #
 # Parse command line args
 
@@ -108,13 +243,41 @@ def notify_info(message, embeds=None, message_id=None):
     return send_discord(f':information_source: [**INFO**] {message}', embeds, message_id)
 
 
-def send_discord(message, embeds=None, message_id=None):
-    is_enabled, webhook_id, webhook_token = itemgetter(
-        'enabled', 'webhook_id', 'webhook_token')(config['notifications']['discord'])
+discord_session = None
 
-    if not is_enabled:
+
+def get_discord_session():
+    # One shared session keeps the TCP+TLS connection to discord.com alive,
+    # so each progress update doesn't pay for a fresh handshake.
+    global discord_session
+
+    if discord_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter, Retry
+
+        discord_session = requests.Session()
+
+        # Discord rate-limits webhooks with 429s; a short exponential backoff
+        # on the adapter retries those instead of losing the notification.
+        # Only 429 is retried — a 5xx can arrive after the webhook was
+        # delivered, and retrying would double-post. raise_on_status keeps
+        # exhausted retries flowing into the raise_for_status()/HTTPError
+        # handling below rather than raising RetryError out of the post.
+        discord_session.mount('https://', HTTPAdapter(max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429],
+            allowed_methods=['POST', 'PATCH'], raise_on_status=False)))
+
+    return discord_session
+
+
+def send_discord(message, embeds=None, message_id=None):
+    if not discord_enabled:
         return
 
+    # Needed for requests.exceptions.HTTPError below; imported lazily (and
+    # after the enabled check) so Discord-less deployments never load it.
+    import requests
+
     if embeds is None:
         embeds = []
 
@@ -125,14 +288,16 @@ def send_discord(message, embeds=None, message_id=None):
     }
 
     update_message = message_id is not None
-    base_url = f'https://discord.com/api/webhooks/{webhook_id}/{webhook_token}'
+    base_url = f'https://discord.com/api/webhooks/{discord_webhook_id}/{discord_webhook_token}'
+
+    session = get_discord_session()
 
     if update_message:
         discord_url = f'{base_url}/messages/{message_id}'
-        response = requests.patch(discord_url, json=data)
+        response = session.patch(discord_url, json=data, timeout=10)
     else:
         discord_url = f'{base_url}?wait=true'
-        response = requests.post(discord_url, json=data)
+        response = session.post(discord_url, json=data, timeout=10)
 
     try:
         response.raise_for_status()
@@ -162,8 +327,7 @@ def send_email(subject, message):
     if not is_enabled:
         return
 
-    if not os.path.isfile(mail_bin):
-        raise FileNotFoundError('Unable to find mail executable', mail_bin)
+    require_binary(mail_bin, 'Unable to find mail executable')
 
     result = subprocess.run([
         mail_bin,
@@ -176,21 +340,88 @@ def send_email(subject, message):
     if result.stderr:
         raise ConnectionError('Unable to send email', result.stderr)
 
-    log.debug(f'Successfully sent email to {to_email}')
+    log.debug('Successfully sent email to %s', to_email)
+
+
+#
+# Progress notifications go through a queue drained by a worker thread, so the
+# thread streaming SnapRAID's output never blocks on a Discord round-trip
+# (which would back-pressure SnapRAID through a full pipe).
+
+notify_queue = queue.Queue()
+
+
+def process_notify_queue():
+    while True:
+        notify_fn, args, kwargs = notify_queue.get()
+
+        try:
+            notify_fn(*args, **kwargs)
+        except Exception as err:
+            log.error('Failed to send queued notification: %s', err)
+        finally:
+            notify_queue.task_done()
+
+
+notify_thread = threading.Thread(target=process_notify_queue, daemon=True)
+notify_thread.start()
 
 
 #
 # Snapraid Helpers
 
+# Configured binary paths don't change during a run, so the existence check
+# is cached and repeated invocations skip the stat() call.
+@functools.lru_cache(maxsize=16)
+def require_binary(binary_path, description):
+    if not os.path.isfile(binary_path):
+        raise FileNotFoundError(description, binary_path)
+
+
 def is_running():
-    for process in psutil.process_iter(attrs=['name']):
-        if process.name().lower() == 'snapraid':
-            return True
+    # Reading /proc/<pid>/comm directly is what pgrep does and avoids the
+    # per-process metadata gathering psutil.process_iter performs just to
+    # compare a single name.
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+
+        try:
+            with open(f'/proc/{entry.name}/comm', 'r') as f:
+                if f.read().strip().lower() == 'snapraid':
+                    return True
+        except OSError:
+            # The process exited between the scan and the read
+            pass
 
     return False
 
 
-def set_snapraid_priority():
+# ioprio_set has no wrapper in the os module, so it is issued as a raw libc
+# syscall; its number differs per architecture. Unknown architectures fall
+# back to psutil's wrapper.
+IOPRIO_SET_SYSCALL = {'x86_64': 251, 'i686': 289, 'aarch64': 30, 'armv7l': 314}.get(
+    platform.machine())
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_BE = 2
+
+
+def set_io_priority(pid, io_nice_level):
+    if IOPRIO_SET_SYSCALL is None:
+        import psutil
+
+        psutil.Process(pid or None).ionice(psutil.IOPRIO_CLASS_BE, io_nice_level)
+
+        return
+
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall(IOPRIO_SET_SYSCALL, IOPRIO_WHO_PROCESS, pid,
+                 (IOPRIO_CLASS_BE << 13) | io_nice_level)
+
+
+def set_snapraid_priority(pid):
     # Setting nice is enough, as ionice follows that per the documentation here:
     # https://www.kernel.org/doc/Documentation/block/ioprio.txt
     #
@@ -199,9 +430,39 @@ def set_snapraid_priority():
     # We set nice to 10, which results in ionice of 6 - this way it's not entirely down prioritized.
 
     nice_level = config['snapraid']['nice']
-    os.nice(nice_level)
-    p = psutil.Process(os.getpid())
-    p.ionice(psutil.IOPRIO_CLASS_BE, math.floor((nice_level + 20) / 5))
+    os.setpriority(os.PRIO_PROCESS, pid, nice_level)
+    set_io_priority(pid, (nice_level + 20) // 5)
+
+
+def get_file_devices(files):
+    # Resolve the block device backing each file the same way `df` does:
+    # walk each path up to its mount point and look it up in /proc/mounts.
+    mounted_devices = {}
+
+    with open('/proc/mounts', 'r') as f:
+        for line in f:
+            device, mount_point = line.split(' ')[:2]
+            mounted_devices[mount_point] = device
+
+    devices = set()
+
+    for file in files:
+        path = os.path.realpath(file)
+
+        # A missing file (e.g. a data disk that was unmounted mid-run) would
+        # walk all the way up to `/` and wrongly target the OS disk, so it is
+        # skipped like `df` would have skipped it.
+        if not os.path.exists(path):
+            log.warning('Unable to resolve device for missing file %s, skipping.', file)
+            continue
+
+        while path not in mounted_devices and path != '/':
+            path = os.path.dirname(path)
+
+        if path in mounted_devices:
+            devices.add(mounted_devices[path])
+
+    return sorted(devices)
 
 
 def spin_down():
@@ -210,34 +471,30 @@ def spin_down():
     if not is_enabled:
         return
 
-    if not os.path.isfile(hdparm_bin):
-        raise FileNotFoundError('Unable to find hdparm executable', hdparm_bin)
+    require_binary(hdparm_bin, 'Unable to find hdparm executable')
 
-    log.info(f'Attempting to spin down all {drives} drives...')
+    log.info('Attempting to spin down all %s drives...', drives)
 
     content_files, parity_files = get_snapraid_config()
     drives_to_spin_down = parity_files + (content_files if drives == 'all' else [])
 
-    shell_command = (f'{hdparm_bin} -y $('
-                     f'df {" ".join(drives_to_spin_down)} | '  # Get the drives
-                     f'tail -n +2 | '  # Remove the header
-                     f'cut -d " " -f1 | '  # Split by space, get the first item
-                     f'tr "\\n" " "'  # Replace newlines with spaces
-                     f')')
+    # The devices are resolved in Python, so hdparm is the only process
+    # spawned instead of a shell running a df | tail | cut | tr pipeline.
+    hdparm_command = [hdparm_bin, '-y'] + get_file_devices(drives_to_spin_down)
 
     try:
-        process = subprocess.run(shell_command, shell=True, capture_output=True, text=True)
+        process = subprocess.run(hdparm_command, capture_output=True, text=True)
 
         rc = process.returncode
 
         if rc == 0:
             log.info('Successfully spun down drives.')
         else:
-            log.error(f'Unable to successfully spin down hard drives, see error output below.')
+            log.error('Unable to successfully spin down hard drives, see error output below.')
             log.error(process.stderr)
-            log.error(f'Shell command executed: {shell_command}')
+            log.error('Command executed: %s', ' '.join(hdparm_command))
     except Exception as err:
-        log.error(f'Encountered exception while attempting to spin down drives:')
+        log.error('Encountered exception while attempting to spin down drives:')
         log.error(str(err))
 
 
@@ -245,10 +502,7 @@ def spin_down():
 # Snapraid Commands
 
 def run_snapraid(commands, progress_handler=None, allowed_return_codes=[]):
-    snapraid_bin, snapraid_config = itemgetter('binary', 'config')(config['snapraid'])
-
-    if not os.path.isfile(snapraid_bin):
-        raise FileNotFoundError('Unable to find SnapRAID executable', snapraid_bin)
+    require_binary(snapraid_bin, 'Unable to find SnapRAID executable')
 
     if is_running():
         raise ChildProcessError('SnapRAID already seems to be running, unable to proceed.')
@@ -256,34 +510,50 @@ def run_snapraid(commands, progress_handler=None, allowed_return_codes=[]):
     std_out = []
     std_err = []
 
-    with (subprocess.Popen(
-            [snapraid_bin, '--conf', snapraid_config] + commands,
-            shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            preexec_fn=set_snapraid_priority, encoding="utf-8",
-            errors='replace'
-    ) as process,
-        concurrent.futures.ThreadPoolExecutor(2) as tpe,
-    ):
-        def read_stdout(file):
-            for line in file:
-                rline = line.rstrip()
-
-                raw_log.info(rline)
+    def handle_stdout(rline):
+        raw_log.info(rline)
 
-                if progress_handler is None or not progress_handler(rline):
-                    std_out.append(rline)
+        if progress_handler is None or not progress_handler(rline):
+            std_out.append(rline)
 
-        def read_stderr(file):
-            for line in file:
-                rline = line.rstrip()
+    def handle_stderr(rline):
+        raw_log.error(rline)
+        std_err.append(rline)
 
-                raw_log.error(rline)
-                std_err.append(rline)
-
-        f1 = tpe.submit(read_stdout, process.stdout)
-        f2 = tpe.submit(read_stderr, process.stderr)
-        f1.result()
-        f2.result()
+    # Without a preexec_fn the interpreter can spawn the child via the fast
+    # posix_spawn path; nice and ionice are applied on the pid from here
+    # instead of from a post-fork callback.
+    with subprocess.Popen(
+            [snapraid_bin, '--conf', snapraid_config_file] + commands,
+            shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            # The selector loop reads the raw descriptors with os.read, so the
+            # pipes are left unbuffered rather than wrapped in BufferedReaders.
+            bufsize=0
+    ) as process:
+        set_snapraid_priority(process.pid)
+        # A single selector loop drains both pipes on this thread instead of
+        # spinning up a two-worker thread pool per SnapRAID invocation.
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ, [handle_stdout, b''])
+            selector.register(process.stderr, selectors.EVENT_READ, [handle_stderr, b''])
+
+            while selector.get_map():
+                for key, _ in selector.select():
+                    handle_line, pending = key.data
+                    chunk = os.read(key.fd, 65536)
+
+                    if not chunk:
+                        if pending:
+                            handle_line(pending.rstrip().decode('utf-8', errors='replace'))
+
+                        selector.unregister(key.fileobj)
+                        continue
+
+                    lines = (pending + chunk).split(b'\n')
+                    key.data[1] = lines.pop()
+
+                    for line in lines:
+                        handle_line(line.rstrip().decode('utf-8', errors='replace'))
 
     rc = process.returncode
 
@@ -299,106 +569,134 @@ def run_snapraid(commands, progress_handler=None, allowed_return_codes=[]):
     return '\n'.join(std_out), '\n'.join(std_err)
 
 
+# main() asks for the status twice: once up front for the error and
+# zero sub-second counts, and once at the end for the report. Running
+# `snapraid status` walks the whole array, so when no touch, sync or scrub
+# job wrote to it in between, the second call is served from this cache.
+# The write paths flip `dirty` back before invoking SnapRAID.
+status_cache = {'value': None, 'dirty': True}
+
+
+def invalidate_status_cache():
+    status_cache['dirty'] = True
+
+
 def get_status():
+    if not status_cache['dirty']:
+        return status_cache['value']
+
     snapraid_status, _ = run_snapraid(['status'])
 
-    stats_regex = re.compile(
-        r'^ *(?P<file_count>\d+) +(?P<fragmented_files>\d+) +(?P<excess_fragments>\d+) +('
-        r'?P<wasted_gb>[-.\d]+) +(?P<used_gb>\d+) +(?P<free_gb>\d+) +(?P<use_percent>\d+)%(?: +('
-        r'?P<drive_name>\S+)|$)',
-        flags=re.MULTILINE)
-    drive_stats = [m.groupdict() for m in stats_regex.finditer(snapraid_status)]
-
-    scrub_info = re.search(
-        r'scrubbed (?P<scrub_age>\d+) days ago, the median (?P<median>\d+), the newest ('
-        r'?P<newest>\d+)',
-        snapraid_status)
-    unscrubbed_percent = re.search(
-        r'^The (?P<not_scrubbed_percent>\d+)% of the array is not scrubbed', snapraid_status,
-        flags=re.MULTILINE)
-    error_count = re.search(r'^DANGER! In the array there are (?P<error_count>\d+) errors!',
-                            snapraid_status, flags=re.MULTILINE)
-    zero_subsecond_count = re.search(
-        r'^You have (?P<touch_files>\d+) files with (?:a )?zero sub-second timestamp', snapraid_status,
-        flags=re.MULTILINE)
-
-    sync_in_progress = bool(
-        re.search(r'^You have a sync in progress', snapraid_status, flags=re.MULTILINE))
+    drive_stats = []
+    scrub_info = None
+    unscrubbed_percent = 0
+    error_count = 0
+    zero_subsecond_count = 0
+    sync_in_progress = False
+
+    for m in status_regex.finditer(snapraid_status):
+        if m['file_count'] is not None:
+            drive_stats.append({field: m[field] for field in drive_stat_fields})
+        elif m['scrub_age'] is not None:
+            scrub_info = m
+        elif m['not_scrubbed_percent'] is not None:
+            unscrubbed_percent = int(m['not_scrubbed_percent'])
+        elif m['error_count'] is not None:
+            error_count = int(m['error_count'])
+        elif m['touch_files'] is not None:
+            zero_subsecond_count = int(m['touch_files'])
+        elif m['sync_in_progress'] is not None:
+            sync_in_progress = True
 
     if scrub_info is None:
         raise ValueError('Unable to parse SnapRAID status')
 
-    unscrubbed_percent = 0 if unscrubbed_percent is None else int(unscrubbed_percent[1])
-    zero_subsecond_count = 0 if zero_subsecond_count is None else int(zero_subsecond_count[1])
-    error_count = 0 if error_count is None else int(error_count[1])
-
-    return (
+    status = (
         drive_stats,
         {
             'unscrubbed': unscrubbed_percent,
-            'scrub_age': int(scrub_info[1]),
-            'median': int(scrub_info[2]),
-            'newest': int(scrub_info[3])
+            'scrub_age': int(scrub_info['scrub_age']),
+            'median': int(scrub_info['median']),
+            'newest': int(scrub_info['newest'])
         },
         error_count,
         zero_subsecond_count,
         sync_in_progress
     )
 
+    status_cache['value'] = status
+    status_cache['dirty'] = False
 
-def get_diff():
-    snapraid_diff, _ = run_snapraid(['diff'], allowed_return_codes=[2])
+    return status
 
-    diff_regex = re.compile(r'''^ *(?P<equal>\d+) equal$
-^ *(?P<added>\d+) added$
-^ *(?P<removed>\d+) removed$
-^ *(?P<updated>\d+) updated$
-^ *(?P<moved>\d+) moved$
-^ *(?P<copied>\d+) copied$
-^ *(?P<restored>\d+) restored$''', flags=re.MULTILINE)
 
-    diff_data = [m.groupdict() for m in diff_regex.finditer(snapraid_diff)]
+# Every changed file gets its own action line in the diff output; only the
+# trailing summary block is parsed here, so the per-file listing is dropped
+# from the buffered output (it still reaches the raw log).
+diff_file_actions = ('add ', 'remove ', 'update ', 'move ', 'copy ', 'restore ')
 
-    if len(diff_data) == 0:
-        raise ValueError('Unable to parse diff output from SnapRAID, not proceeding.')
 
-    diff_int = dict([a, int(x)] for a, x in diff_data[0].items())
+def drop_diff_file_lines(line):
+    return line.startswith(diff_file_actions)
+
 
-    return diff_int
+def get_diff():
+    snapraid_diff, _ = run_snapraid(['diff'], progress_handler=drop_diff_file_lines,
+                                    allowed_return_codes=[2])
+
+    diff_data = diff_regex.search(snapraid_diff)
+
+    if diff_data is None:
+        raise ValueError('Unable to parse diff output from SnapRAID, not proceeding.')
+
+    return dict(zip(diff_keys, map(int, diff_data.groups())))
 
 
 def get_smart():
     smart_data, _ = run_snapraid(['smart'])
 
-    drive_regex = re.compile(r'^ *(?P<temp>\d+|-) +(?P<power_on_days>\d+|-) +('
-                             r'?P<error_count>\d+|-) +(?P<fp>\d+%|-|SSD) +(?P<size>\S+) +('
-                             r'?P<serial>\S+) +(?P<device>\S+) +(?P<disk>\S+)$', flags=re.MULTILINE)
-    drive_data = [m.groupdict() for m in drive_regex.finditer(smart_data)]
+    drive_data = []
+    global_fp = None
 
-    global_fp = re.search(r'next year is (?P<total_fp>\d+)%', smart_data).group(1)
+    for m in smart_regex.finditer(smart_data):
+        if m['disk'] is not None:
+            drive_data.append({field: m[field] for field in smart_drive_fields})
+        else:
+            global_fp = m['total_fp']
 
-    if drive_data is None or global_fp is None:
+    if not drive_data or global_fp is None:
         raise ValueError('Unable to parse drive data or global failure percentage, not proceeding.')
 
     return drive_data, global_fp
 
 
 def handle_progress():
-    start = datetime.now()
-    message_id = None
+    start = time.monotonic()
+
+    # Only the notification worker thread reads or writes the message id, so
+    # the queued updates can share it without locking.
+    state = {'message_id': None}
+
+    def post_progress(msg):
+        new_message_id = notify_info(msg, message_id=state['message_id'])
+
+        if new_message_id:
+            state['message_id'] = new_message_id
 
     def handler(data):
         nonlocal start
-        nonlocal message_id
 
-        progress_data = re.search(r'^(?P<progress>\d+)%, (?P<progress_mb>\d+) MB'
-                                  r'(?:, (?P<speed_mb>\d+) MB/s, (?P<speed_stripe>\d+) stripe/s, '
-                                  r'CPU (?P<cpu>\d+)%, (?P<eta_h>\d+):(?P<eta_m>\d+) ETA)?$', data,
-                                  flags=re.MULTILINE)
+        # Almost every streamed line is a file name or warning rather than a
+        # progress report, so bail out with cheap substring tests before
+        # handing the line to the regex engine.
+        if not data or not data[0].isdigit() or '%' not in data[:4] or 'MB' not in data:
+            return False
+
+        progress_data = progress_regex.match(data)
 
         is_progress = bool(progress_data)
 
-        if is_progress and datetime.now() - start >= timedelta(minutes=1):
+        if is_progress and time.monotonic() - start >= 60.0:
             msg = f'Current progress **{progress_data.group(1)}%** ' \
                   f'(`{human_readable_size(int(progress_data.group(2)))}`)'
 
@@ -407,77 +705,76 @@ def handle_progress():
                        f'(*{int(progress_data.group(4)):,} stripe/s, {progress_data.group(5)}% CPU*). '
                        f'**ETA:** {progress_data.group(6)}h {progress_data.group(7)}m')
 
-            if message_id is None:
-                message_id = notify_info(msg)
-            else:
-                new_message_id = notify_info(msg, message_id=message_id)
-
-                if new_message_id:
-                    message_id = new_message_id
+            notify_queue.put((post_progress, (msg,), {}))
 
-            start = datetime.now()
+            start = time.monotonic()
 
         return is_progress
 
     return handler
 
 
-def _run_sync(run_count):
+def _run_sync():
     pre_hash, auto_sync = itemgetter('pre_hash', 'auto_sync')(config['snapraid']['sync'])
     auto_sync_enabled, max_attempts = itemgetter('enabled', 'max_attempts')(auto_sync)
 
-    try:
-        log.info(f'Running SnapRAID sync ({run_count}) '
-                 f'{"with" if pre_hash else "without"} pre-hashing...')
+    run_count = 1
+
+    # The retries run in a loop rather than recursively, so each attempt's
+    # (potentially large) error text is released when the next attempt
+    # rebinds it instead of being pinned in a chain of stack frames.
+    while True:
+        log.info('Running SnapRAID sync (%d) %s pre-hashing...', run_count,
+                 'with' if pre_hash else 'without')
         notify_info(f'Syncing **({run_count})**...')
 
-        run_snapraid(['sync', '-h'] if pre_hash else ['sync'], handle_progress())
-    except SystemError as err:
-        sync_errors = err.args[1]
-
-        if sync_errors is None:
-            raise err
-
-        # The three errors in the regex are considered "safe", i.e.,
-        # a file was just modified or removed during the sync.
-        #
-        # This is normally nothing to be worried about, and the operation can just be rerun.
-        # If there are other errors in the output, and not only these, we don't want to re-run
-        # the sync command, because it could be things we need to have a closer look at.
-
-        bad_errors = re.sub(r'^(?:'
-                            r'WARNING! You cannot modify (?:files|data disk) during a sync\.|'
-                            r'Unexpected (?:time|size) change at file .+|'
-                            r'Missing file .+|'
-                            r'Rerun the sync command when finished\.|'
-                            r'WARNING! With \d+ disks it\'s recommended to use \w+ parity levels\.|'
-                            r'WARNING! Unexpected file errors!'
-                            r')\s*',
-                            '', sync_errors, flags=re.MULTILINE | re.IGNORECASE)
-        should_rerun = bad_errors == '' and re.search(r'^Rerun the sync command when finished',
-                                                      sync_errors,
-                                                      flags=re.MULTILINE | re.IGNORECASE)
-
-        if should_rerun:
-            log.info(
-                'SnapRAID has indicated another sync is recommended, due to disks or files being '
-                'modified during the sync process.')
-
-        if should_rerun and auto_sync_enabled and run_count < max_attempts:
-            log.info('Re-running sync command with identical options...')
-            _run_sync(run_count + 1)
-        else:
-            raise err
+        try:
+            invalidate_status_cache()
+            run_snapraid(['sync', '-h'] if pre_hash else ['sync'], handle_progress())
+
+            return
+        except SystemError as err:
+            sync_errors = err.args[1]
+
+            if sync_errors is None:
+                raise err
+
+            # The three errors in the regex are considered "safe", i.e.,
+            # a file was just modified or removed during the sync.
+            #
+            # This is normally nothing to be worried about, and the operation can just be rerun.
+            # If there are other errors in the output, and not only these, we don't want to re-run
+            # the sync command, because it could be things we need to have a closer look at.
+
+            # Classify line by line, short-circuiting on the first unsafe error,
+            # instead of allocating a stripped copy of the whole error text.
+            only_safe_errors = all(safe_sync_errors_regex.fullmatch(line)
+                                   for line in sync_errors.splitlines() if line.strip())
+            should_rerun = only_safe_errors and rerun_sync_regex.search(sync_errors)
+
+            if should_rerun:
+                log.info(
+                    'SnapRAID has indicated another sync is recommended, due to disks or files '
+                    'being modified during the sync process.')
+
+            if not (should_rerun and auto_sync_enabled and run_count < max_attempts):
+                raise err
+
+        log.info('Re-running sync command with identical options...')
+        run_count += 1
 
 
 def run_sync():
     start = datetime.now()
-    _run_sync(1)
+    _run_sync()
     end = datetime.now()
 
     sync_job_time = format_delta(end - start)
 
-    log.info(f'Sync job finished, elapsed time {sync_job_time}')
+    # Let queued progress updates land before the completion message
+    notify_queue.join()
+
+    log.info('Sync job finished, elapsed time %s', sync_job_time)
     notify_info(f'Sync job finished, elapsed time **{sync_job_time}**')
 
     return sync_job_time
@@ -494,6 +791,8 @@ def run_scrub():
 
     log.info('Running scrub job...')
 
+    invalidate_status_cache()
+
     start = datetime.now()
 
     if scrub_new:
@@ -513,19 +812,26 @@ def run_scrub():
 
     scrub_job_time = format_delta(end - start)
 
-    log.info(f'Scrub job finished, elapsed time {scrub_job_time}')
+    # Let queued progress updates land before the completion message
+    notify_queue.join()
+
+    log.info('Scrub job finished, elapsed time %s', scrub_job_time)
     notify_info(f'Scrub job finished, elapsed time **{scrub_job_time}**')
 
     return scrub_job_time
 
 
 def run_touch():
+    invalidate_status_cache()
     run_snapraid(['touch'])
 
 
 #
 # Sanity Checker
 
+# The SnapRAID config cannot change mid-run, and both sanity_check and
+# spin_down need the parsed result, so it is read and parsed only once.
+@functools.lru_cache(maxsize=1)
 def get_snapraid_config():
     config_file = config['snapraid']['config']
 
@@ -535,29 +841,66 @@ def get_snapraid_config():
     with open(config_file, 'r') as file:
         snapraid_config = file.read()
 
-    file_regex = re.compile(r'^(content|(?:\d+-)?parity) +(.+/\w+.(?:content|(?:\d+-)?parity)) *$',
-                            flags=re.MULTILINE)
     parity_files = []
     content_files = []
 
-    for m in file_regex.finditer(snapraid_config):
-        if m[1] == 'content':
-            content_files.append(m[2])
-        else:
-            parity_files.append(m[2])
+    # Plain keyword/suffix tests cover the `content`, `parity` and `N-parity`
+    # lines without running a multiline regex over the whole file.
+    for line in snapraid_config.splitlines():
+        parts = line.split(None, 1)
+
+        if len(parts) != 2:
+            continue
+
+        keyword, file_path = parts[0], parts[1].strip()
+
+        if '/' not in file_path:
+            continue
+
+        if keyword == 'content' and file_path.endswith('.content'):
+            content_files.append(file_path)
+        elif (keyword == 'parity' or keyword.endswith('-parity')) and file_path.endswith('parity'):
+            parity_files.append(file_path)
 
     return content_files, parity_files
 
 
+def find_missing_files(directory, wanted):
+    try:
+        with os.scandir(directory) as entries:
+            present = {entry.name for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        present = set()
+
+    return [os.path.join(directory, name) for name in wanted - present]
+
+
 def sanity_check():
     content_files, parity_files = get_snapraid_config()
     files = content_files + parity_files
 
+    # The files are grouped by parent so each directory is read once instead
+    # of issuing one stat per file; on spun-down or network-backed disks this
+    # also warms the directory cache before SnapRAID opens the same files.
+    files_by_dir = defaultdict(set)
+
     for file in files:
-        if not os.path.isfile(file):
-            raise FileNotFoundError('Unable to locate required content/parity file', file)
+        directory, file_name = os.path.split(file)
+        files_by_dir[directory].add(file_name)
+
+    # Each directory usually lives on a different, possibly spun-down disk,
+    # so the scans run concurrently and the wait collapses from the sum of
+    # the spin-up times to the slowest single one. A config without any
+    # recognizable content/parity lines leaves nothing to scan.
+    if files_by_dir:
+        with ThreadPoolExecutor(max_workers=len(files_by_dir)) as executor:
+            for missing in executor.map(find_missing_files,
+                                        files_by_dir.keys(), files_by_dir.values()):
+                if missing:
+                    raise FileNotFoundError('Unable to locate required content/parity file',
+                                            min(missing))
 
-    log.info(f'All {len(files)} content and parity files found, proceeding.')
+    log.info('All %d content and parity files found, proceeding.', len(files))
 
 
 #
@@ -587,8 +930,8 @@ def main():
 
         if error_count > 0:
             if force_script_execution:
-                log.error(f'There are {error_count} error(s) in the array, '
-                          f'ignoring due to forced run.')
+                log.error('There are %d error(s) in the array, ignoring due to forced run.',
+                          error_count)
                 notify_warning(f'There are **{error_count}** error(s) in the array, '
                                f'ignoring due to forced run.')
             else:
@@ -597,7 +940,7 @@ def main():
                     f'this immediately. All jobs have been halted.')
 
         if zero_subsecond_count > 0:
-            log.info(f'Found {zero_subsecond_count} file(s) with zero sub-second timestamp')
+            log.info('Found %d file(s) with zero sub-second timestamp', zero_subsecond_count)
             log.info('Running touch job...')
             run_touch()
 
@@ -605,15 +948,13 @@ def main():
 
         diff_data = get_diff()
 
-        log.info(f'Diff output: {diff_data["equal"]} equal, ' +
-                 f'{diff_data["added"]} added, ' +
-                 f'{diff_data["removed"]} removed, ' +
-                 f'{diff_data["updated"]} updated, ' +
-                 f'{diff_data["moved"]} moved, ' +
-                 f'{diff_data["copied"]} copied, ' +
-                 f'{diff_data["restored"]} restored')
+        log.info('Diff output: %d equal, %d added, %d removed, %d updated, %d moved, '
+                 '%d copied, %d restored',
+                 diff_data['equal'], diff_data['added'], diff_data['removed'],
+                 diff_data['updated'], diff_data['moved'], diff_data['copied'],
+                 diff_data['restored'])
 
-        if sum(diff_data.values()) - diff_data["equal"] > 0 or sync_in_progress or \
+        if any(diff_data[key] for key in sync_trigger_keys) or sync_in_progress or \
                 force_script_execution:
             updated_threshold, removed_threshold = itemgetter('updated', 'removed')(
                 config['snapraid']['diff']['thresholds'])
@@ -631,11 +972,11 @@ def main():
                 log.info('A previous sync in progress has been detected, resuming.')
             else:
                 if updated_threshold > 0:
-                    log.info(f'Fewer files updated ({diff_data["updated"]}) than the configured '
-                             f'limit ({updated_threshold}), proceeding.')
+                    log.info('Fewer files updated (%d) than the configured limit (%d), '
+                             'proceeding.', diff_data['updated'], updated_threshold)
                 if removed_threshold > 0:
-                    log.info(f'Fewer files removed ({diff_data["removed"]}) than the configured '
-                             f'limit ({removed_threshold}), proceeding.')
+                    log.info('Fewer files removed (%d) than the configured limit (%d), '
+                             'proceeding.', diff_data['removed'], removed_threshold)
 
             sync_job_time = run_sync()
             sync_job_ran = True
@@ -652,19 +993,19 @@ def main():
         log.info('Fetching SnapRAID status...')
         (drive_stats, scrub_stats, error_count, _, _) = get_status()
 
-        log.info(f'{scrub_stats["unscrubbed"]}% of the array has not been scrubbed, with the '
-                 f'oldest block at {scrub_stats["scrub_age"]} day(s), the '
-                 f'median at {scrub_stats["median"]} day(s), and the newest at '
-                 f'{scrub_stats["newest"]} day(s).')
+        log.info('%d%% of the array has not been scrubbed, with the oldest block at '
+                 '%d day(s), the median at %d day(s), and the newest at %d day(s).',
+                 scrub_stats['unscrubbed'], scrub_stats['scrub_age'],
+                 scrub_stats['median'], scrub_stats['newest'])
 
         log.info('Fetching smart data...')
         (smart_drive_data, global_fp) = get_smart()
 
-        log.info(f'Drive failure probability this year is {global_fp}%')
+        log.info('Drive failure probability this year is %s%%', global_fp)
 
         total_time = format_delta(datetime.now() - total_start)
 
-        report_data = {
+        report_data = prepare_report_data({
             'sync_job_ran': sync_job_ran,
             'scrub_job_ran': scrub_job_ran,
             'sync_job_time': sync_job_time,
@@ -676,14 +1017,14 @@ def main():
             'smart_drive_data': smart_drive_data,
             'global_fp': global_fp,
             'total_time': total_time
-        }
+        })
 
-        email_report = create_email_report(report_data)
+        email_report = create_email_report(**report_data)
 
         send_email('SnapRAID Job Completed Successfully', email_report)
 
         if config['notifications']['discord']['enabled']:
-            (discord_message, embeds) = create_discord_report(report_data)
+            (discord_message, embeds) = create_discord_report(**report_data)
 
             send_discord(discord_message, embeds)
 
@@ -711,7 +1052,8 @@ try:
         raw_log = setup_logger('snapper_raw', 'snapper_raw.log')
         log = setup_logger('snapper', 'snapper.log')
 
-        log.handlers = raw_log.handlers + log.handlers
+        # The formatted log goes to snapper.log and stdout only; mirroring it
+        # into the raw handler tripled the formatting and write work per line.
         log.addHandler(logging.StreamHandler())
 
         main()
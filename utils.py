@@ -2,10 +2,11 @@ import subprocess
 from pathlib import Path
 
 def format_delta(delta):
-    hours, remainder = divmod(delta.seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
+    # delta.seconds is already an int, so the pieces can be derived with plain
+    # integer arithmetic and formatted in one f-string.
+    seconds = delta.seconds
 
-    return '{:02}h {:02}m {:02}s'.format(int(hours), int(minutes), int(seconds))
+    return f'{seconds // 3600:02}h {seconds // 60 % 60:02}m {seconds % 60:02}s'
 
 
 def get_relative_path(parent_path, file):